@@ -1,47 +1,65 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import atexit
 import base64
+import functools
 import json
+import os
+import re
 from pathlib import Path
-from typing import List, Dict, Any, Union, Tuple
-import urllib.parse
-import textwrap
-from playwright.sync_api import sync_playwright
-
-FONT_FILE_NAME   = "ipaexg.ttf"
-FONT_FAMILY_NAME = "IPAexGothic"
-
-
-def _load_font_as_data_uri(path: Path) -> str:
-    """Return data URI for the given font file."""
-    data = path.read_bytes()
-    b64 = base64.b64encode(data).decode("ascii")
-    return f"data:font/ttf;base64,{b64}"
-
-
-def build_font_css() -> Tuple[str, int]:
+from typing import TYPE_CHECKING, List, Dict, Any, Callable, Iterable, NamedTuple, Optional, Union, Tuple
+# playwright itself, and the modules only used by the batch runner, the daemon and the screenshot writer, are
+# imported where they are needed, so importing this module stays cheap.
+if TYPE_CHECKING:
+    import queue
+    from concurrent.futures import Future
+
+FONT_FILE_NAME        = "ipaexg.ttf"
+FONT_WOFF2_FILE_NAME  = "ipaexg.woff2" # every glyph of FONT_FILE_NAME, WOFF2-compressed by install.sh
+FONT_FAMILY_NAME      = "IPAexGothic"
+# suffix -> (MIME type, @font-face format())
+FONT_FORMATS = {
+    ".woff2": ("font/woff2", "woff2"),
+    ".ttf":   ("font/ttf",   "truetype"),
+}
+# Rendering cost grows with its square: 2 rasterizes 4x the CSS pixels, 3 would be 9x (~2.25x more work).
+# Pass 3 explicitly when sharper output is really needed.
+DEFAULT_DEVICE_SCALE_FACTOR = 2
+# KKTOOLS_PW_VERBOSE=1 enables per-action logs and the font check probe.
+VERBOSE = os.environ.get("KKTOOLS_PW_VERBOSE") == "1"
+# Virtual URL referenced from the injected CSS; never hits the network, see context.route below.
+FONT_URL = f"https://pyplaywright.local/fonts/{FONT_FAMILY_NAME}"
+
+
+@functools.cache
+def build_font_css() -> Tuple[str, int, Optional[Path], str]:
     """
-    Build @font-face CSS for the IPAex Gothic font bundled under ./fonts/ipaexg.ttf.
+    Build @font-face CSS for the IPAex Gothic font bundled under ./fonts/.
+    The WOFF2 build is preferred when install.sh has made it, otherwise ipaexg.ttf is used.
+    The CSS points at FONT_URL, and the returned font path and MIME type are served for it via context.route.
+    Cached, and first called when a page is opened rather than at import.
     """
     base_dir = Path(__file__).resolve().parent
     fonts_dir = base_dir / "fonts"
-    font_path = fonts_dir / FONT_FILE_NAME
+    font_path = fonts_dir / FONT_WOFF2_FILE_NAME
+    if not font_path.exists():
+        font_path = fonts_dir / FONT_FILE_NAME
 
     if not font_path.exists():
-        return "", 0
+        print(f"[warn] font ./fonts/{FONT_FILE_NAME} not found; falling back to default fonts.")
+        return "", 0, None, ""
 
-    try:
-        data_uri = _load_font_as_data_uri(font_path)
-    except OSError as exc:
-        print(f"[warn] failed to load font {font_path}: {exc}")
-        return "", 0
+    if not os.access(font_path, os.R_OK):
+        print(f"[warn] failed to load font {font_path}: not readable")
+        return "", 0, None, ""
+    mime_type, font_format = FONT_FORMATS[font_path.suffix]
     font_definitions = f"""@font-face {{
   font-family: '{FONT_FAMILY_NAME}';
   font-style: normal;
   font-weight: 400;
   font-display: swap;
-  src: url({data_uri}) format('truetype');
+  src: url('{FONT_URL}') format('{font_format}');
 }}
 
 body,
@@ -51,170 +69,961 @@ select,
 textarea {{
   font-family: '{FONT_FAMILY_NAME}', sans-serif;
 }}"""
-    return font_definitions, 1
+    return font_definitions, 1, font_path, mime_type
 
 
-FONT_CSS, FONT_FACE_COUNT = build_font_css()
+def build_font_init_script(font_css: str, mime_type: str) -> str:
+    """
+    Build the context init script that injects the font CSS.
+    The preload starts the font fetch while the HTML is still being parsed. Init scripts usually run before the
+    parser has created <html>, so the link is inserted as soon as the root element appears.
+    The style is appended to <head> once parsed, so it comes after (and wins over) in-document styles.
+    """
+    if not font_css:
+        return ""
+    return f"""
+(() => {{
+  const preload = () => {{
+    const link = document.createElement('link');
+    link.rel = 'preload';
+    link.as = 'font';
+    link.type = {json.dumps(mime_type)};
+    link.href = {json.dumps(FONT_URL)};
+    link.crossOrigin = 'anonymous';
+    document.documentElement.appendChild(link);
+  }};
+  if (document.documentElement) {{
+    preload();
+  }} else {{
+    const observer = new MutationObserver(() => {{
+      if (document.documentElement) {{
+        observer.disconnect();
+        preload();
+      }}
+    }});
+    observer.observe(document, {{ childList: true }});
+  }}
+  document.addEventListener('DOMContentLoaded', () => {{
+    const style = document.createElement('style');
+    style.textContent = {json.dumps(font_css)};
+    (document.head || document.documentElement).appendChild(style);
+  }});
+}})();
+"""
+
+
+@functools.cache
+def _get_font_init_script() -> str:
+    # Built once instead of re-escaping the CSS into a new script for every context.
+    font_css, _, _, mime_type = build_font_css()
+    return build_font_init_script(font_css, mime_type)
+
+
+FONT_READY_TIMEOUT_MS = 5000
+
+# Page-side helpers installed once per context, so repeated evaluate calls only ship a short call expression.
+HELPERS_INIT_SCRIPT = """
+window.__kk = {
+  scrollWin: (o) => window.scrollBy(o.x, o.y),
+  scrollEl: (sel, o) => {
+    const el = document.querySelector(sel);
+    if (!el) throw new Error('no element matches selector: ' + sel);
+    el.scrollBy(o.x, o.y);
+  },
+  // Resolves 'ready' once the face of font `v` and every pending font load are done, 'failed' when loading
+  // rejects, 'timeout' after `ms`.
+  fontsReady: (v, ms) => {
+    if (!document.fonts) return 'ready';
+    const ready = document.fonts.load(v).then(() => document.fonts.ready).then(() => 'ready', () => 'failed');
+    return Promise.race([ready, new Promise((r) => setTimeout(() => r('timeout'), ms))]);
+  },
+  fontLoaded: (v) => document.fonts ? document.fonts.check(v) : false,
+  // Resolves after the next frame; the timeout covers pages that don't paint (e.g. a hidden --head tab).
+  nextFrame: () => new Promise((r) => { requestAnimationFrame(() => r()); setTimeout(r, 100); }),
+  // Runs a batch of in-page actions sent as short opcodes (see ScrollAction.payload). The scrolls run back to
+  // back without forcing layout in between; one frame is yielded at the end so the next action (e.g. a
+  // screenshot) sees the scrolled state.
+  runActions: async (actions) => {
+    for (const a of actions) {
+      switch (a.a) {
+        case 's':
+          if (a.t === 'window') window.__kk.scrollWin(a);
+          else window.__kk.scrollEl(a.t, a);
+          break;
+        default:
+          throw new Error('not an in-page action: ' + a.a);
+      }
+    }
+    await window.__kk.nextFrame();
+  },
+};
+"""
+
+
+# Raw CDP captures don't hide the text caret the way page.screenshot does, so a screenshot taken right after a
+# "type" action could include a blinking caret. Like page.screenshot(caret="hide"), the style only exists
+# for the duration of the capture.
+HIDE_CARET_SCRIPT = """
+() => {
+  const style = document.createElement('style');
+  style.id = '__kk_hide_caret';
+  style.textContent = '*, *::before, *::after { caret-color: transparent !important; }';
+  (document.head || document.documentElement).appendChild(style);
+}
+"""
+SHOW_CARET_SCRIPT = "() => document.getElementById('__kk_hide_caret')?.remove()"
+
+
+# Resource types dropped when the actions take no screenshot: nothing visual is ever looked at.
+NO_SCREENSHOT_BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font"})
+# Still dropped when screenshots are taken: media never renders a stable frame anyway.
+SCREENSHOT_BLOCKED_RESOURCE_TYPES = frozenset({"media"})
+# Third-party analytics/tag hosts, dropped in both cases.
+ANALYTICS_URL_PATTERN = re.compile(
+    r"^https?://([^/]+\.)?(google-analytics\.com|googletagmanager\.com|doubleclick\.net|"
+    r"connect\.facebook\.net|hotjar\.com|clarity\.ms|segment\.(io|com))/"
+)
+
+
+# CLI names accepted by --block / block_resources -> playwright resource types.
+BLOCKABLE_RESOURCE_TYPES = {
+    "images": "image", "image": "image",
+    "fonts": "font", "font": "font",
+    "stylesheets": "stylesheet", "stylesheet": "stylesheet",
+    "media": "media",
+}
+
+
+def parse_block_resources(value: Union[str, Iterable[str]]) -> frozenset:
+    """Turn "images,fonts,stylesheets" (or a list of such names) into a set of playwright resource types."""
+    names = value.split(",") if isinstance(value, str) else value
+    blocked = set()
+    for name in names:
+        name = name.strip()
+        if not name:
+            continue
+        if name not in BLOCKABLE_RESOURCE_TYPES:
+            raise ValueError(f"unknown resource type to block: {name} (choose from {sorted(BLOCKABLE_RESOURCE_TYPES)})")
+        blocked.add(BLOCKABLE_RESOURCE_TYPES[name])
+    return frozenset(blocked)
+
+
+def _install_resource_blocking(context, blocked_types: frozenset) -> None:
+    def _handle(route) -> None:
+        request = route.request
+        if request.resource_type in blocked_types or ANALYTICS_URL_PATTERN.match(request.url):
+            route.abort()
+        else:
+            # Let other routes (the font one) see the request too.
+            route.fallback()
+    context.route("**/*", _handle)
+
+
+def _fulfill_font(route) -> None:
+    # Fonts are fetched in CORS mode, and data:/file: pages have an opaque origin.
+    # Passing the path lets playwright read the file itself, so python never holds the font bytes.
+    _, _, font_path, mime_type = build_font_css()
+    route.fulfill(
+        status=200,
+        content_type=mime_type,
+        headers={"Access-Control-Allow-Origin": "*"},
+        path=font_path,
+    )
 
 
-def run_actions_on_html(
-    html_path: Union[Path, str],
-    actions: List[Dict[str, Any]],
-    viewport=(1080, 2400),
-    device_scale_factor=3,
-    is_head: bool=False,
-    is_no_sandbox: bool=False
+_PW_STATE: Dict[str, Any] = {"pw": None, "browsers": {}}
+
+
+def _detect_container() -> bool:
+    return bool(os.environ.get("container")) or Path("/.dockerenv").exists()
+
+
+IS_CONTAINER = _detect_container()
+
+
+def _is_sandbox_error(exc: Exception) -> bool:
+    message = str(exc).lower()
+    return "sandbox" in message or "suid" in message
+
+
+def _launch_chromium(p, is_head: bool, is_sandbox: bool, extra_chromium_args: Optional[List[str]]=None):
+    # Chromium stays multi-process (no --single-process/--no-zygote) so paint and raster can use several cores.
+    # Pass those through extra_chromium_args on hosts that allow only one process.
+    args = []
+    if not is_head and IS_CONTAINER:
+        # Containers rarely expose a GPU.
+        args.append("--disable-gpu")
+    if not is_sandbox:
+        args += ["--no-sandbox", "--disable-setuid-sandbox"]
+    return p.chromium.launch(
+        headless=(is_head == False),
+        chromium_sandbox=is_sandbox,
+        args=args + list(extra_chromium_args or []),
+    )
+
+
+def _launch_browser(
+    p, is_head: bool, is_no_sandbox: Optional[bool]=None, extra_chromium_args: Optional[List[str]]=None
 ):
-    if FONT_FACE_COUNT == 0:
-        print(f"[warn] font ./fonts/{FONT_FILE_NAME} not found; falling back to default fonts.")
-    if isinstance(html_path, str) and html_path.startswith("data:"):
-        url = html_path
-    else:
-        url = Path(html_path).resolve().as_uri()
+    """
+    Launch chromium, or firefox when chromium can't start. Returns (browser, engine name).
+    Chromium runs without its sandbox unless is_no_sandbox is explicitly False. When that sandbox can't start,
+    chromium is retried without it before falling back to firefox.
+    """
+    is_sandbox = is_no_sandbox is False
+    launch_errors = []
+
+    # Prefer chromium, but fall back to firefox if sandbox restrictions block launch.
+    try:
+        return _launch_chromium(p, is_head, is_sandbox, extra_chromium_args), "chromium"
+    except Exception as exc:
+        launch_errors.append(("chromium", str(exc)))
+        if is_sandbox and _is_sandbox_error(exc):
+            print("[warn] chromium sandbox failed to start; retrying with --no-sandbox")
+            try:
+                return _launch_chromium(p, is_head, False, extra_chromium_args), "chromium"
+            except Exception as exc_retry:
+                launch_errors.append(("chromium --no-sandbox", str(exc_retry)))
+    try:
+        return p.firefox.launch(headless=(is_head == False)), "firefox"
+    except Exception as exc:
+        launch_errors.append(("firefox", str(exc)))
+
+    raise RuntimeError(f"Browser launch failed: {launch_errors}")
 
-    with sync_playwright() as p:
-        browser = None
-        engine_used = None
-        launch_errors = []
 
-        # Prefer chromium, but fall back to firefox if sandbox restrictions block launch.
-        for engine in ("chromium", "firefox"):
+def _get_browser(
+    is_head: bool, is_no_sandbox: Optional[bool]=None, extra_chromium_args: Optional[List[str]]=None
+):
+    """
+    Return a (browser, engine name) pair launched once per process and per launch options.
+    Playwright's sync API is bound to the thread that started it, so only call this from one thread.
+    """
+    key = (is_head, is_no_sandbox is False, tuple(extra_chromium_args or ()))
+    browser, engine = _PW_STATE["browsers"].get(key, (None, None))
+    if browser is not None and browser.is_connected():
+        return browser, engine
+    if _PW_STATE["pw"] is None:
+        from playwright.sync_api import sync_playwright
+        _PW_STATE["pw"] = sync_playwright().start()
+    browser, engine = _launch_browser(_PW_STATE["pw"], is_head, is_no_sandbox, extra_chromium_args)
+    _PW_STATE["browsers"][key] = (browser, engine)
+    return browser, engine
+
+
+def close_browsers():
+    """Close every cached browser and stop playwright. Registered with atexit."""
+    for browser, _ in _PW_STATE["browsers"].values():
+        try:
+            browser.close()
+        except Exception as exc:
+            print(f"[warn] browser close failed: {exc}")
+    _PW_STATE["browsers"].clear()
+    if _PW_STATE["pw"] is not None:
+        _PW_STATE["pw"].stop()
+        _PW_STATE["pw"] = None
+
+
+atexit.register(close_browsers)
+
+
+# Strings starting with one of these are already URLs and go to page.goto as they are.
+URL_PREFIXES = ("data:", "http:", "https:", "file:")
+
+
+def _to_url(html_path: Union[Path, str]) -> str:
+    if isinstance(html_path, str) and html_path.startswith(URL_PREFIXES):
+        return html_path
+    return Path(html_path).resolve().as_uri()
+
+
+# file suffix -> screenshot format. jpeg/webp encode several times faster than png.
+SCREENSHOT_FORMATS = {".png": "png", ".jpg": "jpeg", ".jpeg": "jpeg", ".webp": "webp"}
+SCREENSHOT_SUFFIXES = {"png": ".png", "jpeg": ".jpg", "webp": ".webp"}
+SCREENSHOT_FORMAT_ALIASES = {"jpg": "jpeg"}
+SCREENSHOT_DEFAULT_QUALITY = 85
+
+
+def _screenshot_options(action: Dict[str, Any], i: int) -> Tuple[str, str, Optional[int]]:
+    """
+    Resolve (path, format, quality) of a screenshot action.
+    The format comes from "format" if given, otherwise from the path suffix (png when unknown).
+    """
+    fmt  = action.get("format")
+    fmt  = SCREENSHOT_FORMAT_ALIASES.get(fmt, fmt) if isinstance(fmt, str) else fmt
+    path = action.get("path")
+    if fmt is None:
+        fmt = SCREENSHOT_FORMATS.get(Path(path).suffix.lower(), "png") if path else "png"
+    if not isinstance(fmt, str) or fmt not in SCREENSHOT_SUFFIXES:
+        raise ValueError(f"unknown screenshot format: {fmt}")
+    if path is None:
+        path = f"shot_{i:03}{SCREENSHOT_SUFFIXES[fmt]}"
+    quality = None if fmt == "png" else action.get("quality", SCREENSHOT_DEFAULT_QUALITY)
+    return path, fmt, quality
+
+
+def _capture_screenshot_cdp(cdp, full_page: bool, fmt: str="png", quality: Optional[int]=None) -> str:
+    """
+    Take a screenshot with CDP Page.captureScreenshot (chromium only) and return it base64 encoded.
+    Full pages are captured in one pass with captureBeyondViewport instead of being stitched.
+    """
+    params: Dict[str, Any] = {
+        "format": fmt,
+        "fromSurface": True,
+        "optimizeForSpeed": True,
+        "captureBeyondViewport": full_page,
+    }
+    if quality is not None:
+        params["quality"] = quality
+    if full_page:
+        metrics = cdp.send("Page.getLayoutMetrics")
+        size = metrics.get("cssContentSize") or metrics["contentSize"]
+        params["clip"] = {"x": 0, "y": 0, "width": size["width"], "height": size["height"], "scale": 1}
+    result = cdp.send("Page.captureScreenshot", params)
+    return result["data"]
+
+
+@functools.cache
+def _get_screenshot_writer():
+    """
+    Single thread that writes screenshot files so the next actions don't wait for the disk; see run_actions.
+    One worker keeps the writes in capture order, so when several screenshots share a path the last one wins.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="pyplaywright-screenshot")
+
+
+def _write_screenshot(path: str, data: Union[bytes, str]) -> None:
+    """Write screenshot bytes, or the base64 string returned by CDP, to path. Missing directories are created."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_bytes(base64.b64decode(data) if isinstance(data, str) else data)
+
+
+def _page_cached(cache: Dict[Any, Any], page, create: Callable[[], Any]) -> Any:
+    """
+    Return cache[page], calling create() on first use. The entry is popped when the page closes: cached values
+    (CDP sessions, locators) reference their page, so a WeakKeyDictionary key would never be freed.
+    """
+    value = cache.get(page)
+    if value is None:
+        value = create()
+        cache[page] = value
+        page.on("close", lambda closed: cache.pop(closed, None))
+    return value
+
+
+# page -> CDP session, see _page_cached.
+_CDP_SESSIONS: Dict[Any, Any] = {}
+
+
+def _get_cdp_session(page):
+    """Return the CDP session of a chromium page, created on first use."""
+    return _page_cached(_CDP_SESSIONS, page, lambda: page.context.new_cdp_session(page))
+
+
+# page -> {selector: Locator}, see _page_cached. Locators resolve lazily, so they stay valid across navigations.
+_LOCATOR_CACHES: Dict[Any, Dict[str, Any]] = {}
+
+
+def _get_locator(page, selector: str):
+    """Return the locator of the first element matching selector (as page.click/page.fill did), cached per page."""
+    cache = _page_cached(_LOCATOR_CACHES, page, dict)
+    locator = cache.get(selector)
+    if locator is None:
+        locator = page.locator(selector).first
+        cache[selector] = locator
+    return locator
+
+
+# Actions are compiled from their JSON form once, up front (see compile_action), so a malformed list fails
+# before any browser is launched. Each one knows how to run itself on a page.
+
+class ClickAction(NamedTuple):
+    selector: str
+
+    def run(self, page) -> None:
+        _get_locator(page, self.selector).click()
+
+
+class WaitAction(NamedTuple):
+    ms: int = 500
+
+    def run(self, page) -> None:
+        # Hard sleep, mostly for debugging / watching with --head. Prefer wait_ready.
+        page.wait_for_timeout(self.ms)
+
+
+class WaitReadyAction(NamedTuple):
+    state: str = "networkidle"
+    timeout: int = 10000
+
+    def check(self) -> None:
+        if self.state not in LOAD_STATES:
+            raise ValueError(f"state must be one of {', '.join(LOAD_STATES)}, got {self.state!r}")
+
+    def run(self, page) -> None:
+        # Returns as soon as the load state is reached; "timeout" is only an upper bound, not an error.
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+        try:
+            page.wait_for_load_state(self.state, timeout=self.timeout)
+        except PlaywrightTimeoutError:
+            print(f"[warn] {self.state} not reached within {self.timeout}ms; continuing")
+
+
+class WaitNetworkIdleAction(NamedTuple):
+    timeout: int = 30000
+
+    def run(self, page) -> None:
+        page.wait_for_load_state("networkidle", timeout=self.timeout)
+
+
+class TypeAction(NamedTuple):
+    selector: str
+    text: str
+    clear: bool = True
+
+    def run(self, page) -> None:
+        locator = _get_locator(page, self.selector)
+        if self.clear:
+            locator.fill("")
+        locator.press_sequentially(self.text)
+
+
+class ScreenshotAction(NamedTuple):
+    path: str
+    format: str = "png"
+    quality: Optional[int] = None
+    full_page: bool = True
+
+    def check(self) -> None:
+        if self.format not in SCREENSHOT_SUFFIXES:
+            raise ValueError(f"unknown screenshot format: {self.format}")
+        if self.quality is not None and not 0 <= self.quality <= 100:
+            raise ValueError(f"quality must be between 0 and 100, got {self.quality}")
+
+    def run(self, page) -> "Future[None]":
+        # Only the capture happens here; the file is written by the screenshot writer and the returned future is
+        # awaited at the end of run_actions.
+        if page.context.browser.browser_type.name == "chromium":
+            page.evaluate(HIDE_CARET_SCRIPT)
             try:
-                if engine == "chromium":
-                    browser = p.chromium.launch(
-                        headless=(is_head == False),
-                        chromium_sandbox=False,
-                        args=[
-                            "--single-process",
-                            "--no-zygote",
-                            "--disable-gpu",
-                        ] + (["--no-sandbox", "--disable-setuid-sandbox"] if is_no_sandbox else []),
-                    )
-                else:
-                    browser = p.firefox.launch(headless=(is_head == False))
-                engine_used = engine
-                break
-            except Exception as exc:
-                launch_errors.append((engine, str(exc)))
-                continue
+                data = _capture_screenshot_cdp(_get_cdp_session(page), self.full_page, self.format, self.quality)
+            finally:
+                page.evaluate(SHOW_CARET_SCRIPT)
+        else:
+            fmt = self.format
+            if fmt == "webp":
+                # page.screenshot only encodes png/jpeg.
+                print(f"[warn] webp screenshots need chromium; saving {self.path} as jpeg")
+                fmt = "jpeg"
+            data = page.screenshot(full_page=self.full_page, type=fmt, quality=self.quality)
+        return _get_screenshot_writer().submit(_write_screenshot, self.path, data)
+
+
+class ScrollAction(NamedTuple):
+    # target は "window"（ウィンドウ全体）か、スクロールさせたい要素の CSS セレクタ
+    target: str = "window"
+    x: int = 0
+    y: int = 0
+
+    def payload(self) -> Dict[str, Any]:
+        # Opcode form read by window.__kk.runActions: a=action ("s" = scroll), t=target.
+        # The selector is queried in the page, so building a batch costs no extra round trip.
+        return {
+            "a": "s",
+            "t": self.target,
+            "x": self.x,
+            "y": self.y,
+        }
+
+    def run(self, page) -> None:
+        _run_in_page(page, [self.payload()])
+
+
+Action = Union[
+    ClickAction, WaitAction, WaitReadyAction, WaitNetworkIdleAction, TypeAction, ScreenshotAction, ScrollAction
+]
+
+# "action" value in the JSON form -> action class
+ACTION_TYPES: Dict[str, Any] = {
+    "click":            ClickAction,
+    "wait":             WaitAction,
+    "wait_ready":       WaitReadyAction,
+    "wait_networkidle": WaitNetworkIdleAction,
+    "type":             TypeAction,
+    "screenshot":       ScreenshotAction,
+    "scroll":           ScrollAction,
+}
+
+# Actions that only touch the DOM. Consecutive ones are sent to the page together in a single evaluate
+# (see _run_in_page). click/type stay on the driver side so they keep playwright's actionability
+# waits and real input events.
+_IN_PAGE_ACTION_TYPES = (ScrollAction,)
+
+# The runner itself is installed with HELPERS_INIT_SCRIPT, so only the opcodes travel per batch.
+# Resolves false without running anything when the helpers are missing.
+_IN_PAGE_BATCH_SCRIPT = "(a) => window.__kk ? window.__kk.runActions(a).then(() => true) : false"
+
+
+def _run_in_page(page, payloads: List[Dict[str, Any]]) -> None:
+    """
+    Run a batch of in-page action payloads in one evaluate.
+    Pages not opened by open_page lack the helpers; they are installed on the first batch that needs them.
+    """
+    if not page.evaluate(_IN_PAGE_BATCH_SCRIPT, payloads):
+        # Wrapped in a function so the evaluate returns nothing instead of serializing window.__kk.
+        page.evaluate(f"() => {{ {HELPERS_INIT_SCRIPT} }}")
+        page.evaluate(_IN_PAGE_BATCH_SCRIPT, payloads)
 
-        if browser is None:
-            raise RuntimeError(f"Browser launch failed: {launch_errors}")
-
-        context = (
-            browser.new_context(
-                viewport={"width": viewport[0], "height": viewport[1]},
-                device_scale_factor=device_scale_factor,
-                is_mobile=True,
-                user_agent=(
-                    "Mozilla/5.0 (Linux; Android 14; Pixel 7 Pro) "
-                    "AppleWebKit/537.36 (KHTML, like Gecko) "
-                    "Chrome/118.0.0.0 Mobile Safari/537.36"
-                ),
-            )
-            if engine_used == "chromium"
-            else browser.new_context(
-                viewport={"width": viewport[0], "height": viewport[1]},
-                is_mobile=True,
-                user_agent=(
-                    "Mozilla/5.0 (Linux; Android 14; Pixel 7 Pro; rv:118.0) "
-                    "Gecko/20100101 Firefox/118.0"
-                ),
-            )
+
+LOAD_STATES = ("load", "domcontentloaded", "networkidle")
+
+# field annotation -> accepted value types. JSON numbers may come as floats; bool is rejected for numbers below.
+_FIELD_TYPES: Dict[Any, Tuple[type, ...]] = {
+    str:           (str,),
+    int:           (int, float),
+    bool:          (bool,),
+    Optional[int]: (int, type(None)),
+}
+
+
+def _check_action(action: Action) -> None:
+    """Raise TypeError/ValueError when a field of action has the wrong type or value."""
+    for name, annotation in type(action).__annotations__.items():
+        value = getattr(action, name)
+        expected = _FIELD_TYPES[annotation]
+        if not isinstance(value, expected) or (isinstance(value, bool) and bool not in expected):
+            raise TypeError(f"{name} must be {' or '.join(t.__name__ for t in expected)}, got {value!r}")
+    check = getattr(action, "check", None)
+    if check is not None:
+        check()
+
+
+def compile_action(action: Union[Dict[str, Any], Action], i: int=0) -> Action:
+    """
+    Turn one JSON action (e.g. {"action": "click", "selector": "#btn"}) into its action object.
+    i is the position in the list, used for the default screenshot path and error messages.
+    Raises ValueError on an unknown action, a missing or unexpected key, or a field of the wrong type or value.
+    """
+    if isinstance(action, tuple(ACTION_TYPES.values())):
+        try:
+            _check_action(action)
+        except (TypeError, ValueError) as exc:
+            raise ValueError(f"action [{i}] {action}: {exc}") from None
+        return action
+    if not isinstance(action, dict):
+        raise ValueError(f"action [{i}] must be an object, got {action!r}")
+    kind = action.get("action")
+    action_type = ACTION_TYPES.get(kind)
+    if action_type is None:
+        raise ValueError(f"action [{i}]: unknown action: {kind}")
+    params = {key: value for key, value in action.items() if key != "action"}
+    try:
+        if action_type is ScreenshotAction:
+            path, fmt, quality = _screenshot_options(action, i)
+            params.update(path=path, format=fmt, quality=quality)
+        compiled = action_type(**params)
+        _check_action(compiled)
+        return compiled
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"action [{i}] {kind}: {exc}") from None
+
+
+def compile_actions(actions: Iterable[Union[Dict[str, Any], Action]]) -> List[Action]:
+    """compile_action over a whole list; already compiled entries are kept as they are."""
+    return [compile_action(action, i) for i, action in enumerate(actions)]
+
+
+def _open_page_in_browser(
+    browser,
+    engine_used: str,
+    url: str,
+    viewport=(1080, 2400),
+    device_scale_factor=DEFAULT_DEVICE_SCALE_FACTOR,
+    is_screenshot: bool=True,
+    block_resources: Optional[Union[str, Iterable[str]]]=None,
+):
+    """Open url in a fresh context of the given browser and wait for fonts. Returns (context, page)."""
+    if block_resources is None:
+        blocked_types = SCREENSHOT_BLOCKED_RESOURCE_TYPES if is_screenshot else NO_SCREENSHOT_BLOCKED_RESOURCE_TYPES
+    else:
+        blocked_types = parse_block_resources(block_resources)
+    context = (
+        browser.new_context(
+            viewport={"width": viewport[0], "height": viewport[1]},
+            device_scale_factor=device_scale_factor,
+            is_mobile=True,
+            user_agent=(
+                "Mozilla/5.0 (Linux; Android 14; Pixel 7 Pro) "
+                "AppleWebKit/537.36 (KHTML, like Gecko) "
+                "Chrome/118.0.0.0 Mobile Safari/537.36"
+            ),
         )
+        if engine_used == "chromium"
+        else browser.new_context(
+            viewport={"width": viewport[0], "height": viewport[1]},
+            is_mobile=True,
+            user_agent=(
+                "Mozilla/5.0 (Linux; Android 14; Pixel 7 Pro; rv:118.0) "
+                "Gecko/20100101 Firefox/118.0"
+            ),
+        )
+    )
 
+    try:
+        context.add_init_script(HELPERS_INIT_SCRIPT)
+        font_css, font_face_count, _, _ = build_font_css()
+        inject_font = bool(font_css) and is_screenshot and "font" not in blocked_types
         # Inject font CSS as early as possible so the initial render uses it.
-        if FONT_CSS:
-            print(f"[info] injecting custom font css ({FONT_FACE_COUNT} face(s))")
-            context.add_init_script(
-                f"""
-                (() => {{
-                  const style = document.createElement('style');
-                  style.textContent = {json.dumps(FONT_CSS)};
-                  document.documentElement.appendChild(style);
-                }})();
-                """
-            )
+        if inject_font:
+            context.route(FONT_URL, _fulfill_font)
+            print(f"[info] injecting custom font css ({font_face_count} face(s))")
+            context.add_init_script(_get_font_init_script())
 
-        page = context.new_page()
-        page.goto(url)
-        page.wait_for_load_state("networkidle")
+        # Registered after the font route so it is consulted first, see _install_resource_blocking.
+        _install_resource_blocking(context, blocked_types)
 
-        # Append style again so it wins cascade order over in-document styles
-        if FONT_CSS:
-            try:
-                page.add_style_tag(content=FONT_CSS)
-            except Exception as exc:
-                print(f"[warn] page-level font css injection failed: {exc}")
+        page = context.new_page()
+        page.goto(url, wait_until="domcontentloaded")
+        # Font readiness is awaited explicitly below; pages that need XHRs to settle use "wait_networkidle".
 
         # Ensure fonts are ready before taking screenshots
-        if FONT_CSS:
+        if inject_font:
             font_check_value = f'12px "{FONT_FAMILY_NAME}"'
-            font_check_value_json = json.dumps(font_check_value)
+            # Awaits the document.fonts promises directly instead of polling every 100ms.
             try:
-                page.wait_for_function(
-                    "() => document.fonts && document.fonts.status === 'loaded'",
-                    timeout=5000,
+                status = page.evaluate(
+                    "([v, ms]) => window.__kk.fontsReady(v, ms)", [font_check_value, FONT_READY_TIMEOUT_MS]
                 )
-            except Exception:
+                if status == "timeout":
+                    print(f"[warn] font readiness wait timed out after {FONT_READY_TIMEOUT_MS}ms")
+                elif status == "failed":
+                    print(f"[warn] font '{FONT_FAMILY_NAME}' failed to load")
+            except Exception as exc:
+                print(f"[warn] font readiness wait failed: {exc}")
+            if VERBOSE:
+                # Diagnostic only: costs one more round trip to the page.
+                try:
+                    ok = page.evaluate("(v) => window.__kk.fontLoaded(v)", font_check_value)
+                    print(f"[info] font check '{FONT_FAMILY_NAME}': {ok}")
+                except Exception as exc:
+                    print(f"[warn] font check evaluation failed: {exc}")
+    except Exception:
+        context.close()
+        raise
+    return context, page
+
+
+def _has_screenshot(actions: List[Action]) -> bool:
+    return any(isinstance(action, ScreenshotAction) for action in actions)
+
+
+def run_actions(page, actions: Iterable[Union[Dict[str, Any], Action]]):
+    """
+    Run the actions in order on an already opened page, e.g. one returned by open_page or any playwright page.
+    Screenshot files are written in the background while the following actions run; all of them are written
+    by the time this returns.
+    """
+    actions = compile_actions(actions)
+    pending: List["Future[None]"] = []  # screenshot writes still in flight
+    try:
+        i = 0
+        while i < len(actions):
+            if isinstance(actions[i], _IN_PAGE_ACTION_TYPES):
+                # One round trip for the whole run of consecutive in-page actions.
+                j = i
+                while j < len(actions) and isinstance(actions[j], _IN_PAGE_ACTION_TYPES):
+                    if VERBOSE:
+                        print(f"[{j}] do: {actions[j]}")
+                    j += 1
+                _run_in_page(page, [action.payload() for action in actions[i:j]])
+                i = j
+                continue
+            if VERBOSE:
+                print(f"[{i}] do: {actions[i]}")
+            future = actions[i].run(page)
+            if future is not None:
+                pending.append(future)
+            i += 1
+    finally:
+        # Every file is on disk when this returns; a failed write raises here.
+        if pending:
+            from concurrent.futures import wait
+            wait(pending)
+    for future in pending:
+        future.result()
+
+
+def _run_actions_in_browser(
+    browser,
+    engine_used: str,
+    url: str,
+    actions: List[Action],
+    viewport=(1080, 2400),
+    device_scale_factor=DEFAULT_DEVICE_SCALE_FACTOR,
+    block_resources: Optional[Union[str, Iterable[str]]]=None,
+):
+    """Open url in a fresh context of the given browser, run the compiled actions and close the context."""
+    is_screenshot = _has_screenshot(actions)
+    context, page = _open_page_in_browser(
+        browser, engine_used, url, viewport, device_scale_factor, is_screenshot, block_resources
+    )
+    try:
+        run_actions(page, actions)
+    finally:
+        context.close()
+
+
+def open_page(
+    html_path: Union[Path, str],
+    viewport=(1080, 2400),
+    device_scale_factor=DEFAULT_DEVICE_SCALE_FACTOR,
+    is_head: bool=False,
+    is_no_sandbox: Optional[bool]=None,
+    extra_chromium_args: Optional[List[str]]=None,
+    is_screenshot: bool=True,
+    block_resources: Optional[Union[str, Iterable[str]]]=None
+):
+    """
+    Load html_path once and return (context, page) so several run_actions calls can reuse the parsed page.
+    is_screenshot=False skips the font injection and blocks images/media/fonts.
+    block_resources (e.g. "images,fonts,stylesheets") replaces that automatic choice of blocked resource types.
+    Close the returned context when done; the browser itself stays cached, see _get_browser.
+    """
+    url = _to_url(html_path)
+    browser, engine_used = _get_browser(is_head, is_no_sandbox, extra_chromium_args)
+    return _open_page_in_browser(
+        browser, engine_used, url, viewport, device_scale_factor, is_screenshot, block_resources
+    )
+
+
+def run_actions_on_html(
+    html_path: Union[Path, str],
+    actions: Iterable[Union[Dict[str, Any], Action]],
+    viewport=(1080, 2400),
+    device_scale_factor=DEFAULT_DEVICE_SCALE_FACTOR,
+    is_head: bool=False,
+    is_no_sandbox: Optional[bool]=None,
+    extra_chromium_args: Optional[List[str]]=None,
+    block_resources: Optional[Union[str, Iterable[str]]]=None
+):
+    """
+    Load html_path (file path or data URI) in a mobile-like context and run the actions in order.
+    device_scale_factor is the device pixel ratio of the page (see DEFAULT_DEVICE_SCALE_FACTOR).
+    Without block_resources, images/media/fonts are blocked when no screenshot action is present.
+    The actions are validated (see compile_action) before anything is launched.
+    """
+    actions = compile_actions(actions)
+    is_screenshot = _has_screenshot(actions)
+    context, page = open_page(
+        html_path, viewport, device_scale_factor, is_head, is_no_sandbox, extra_chromium_args,
+        is_screenshot, block_resources,
+    )
+    try:
+        run_actions(page, actions)
+    finally:
+        context.close()
+
+
+def _run_batch_worker(
+    jobs: "queue.Queue[Tuple[int, Union[Path, str], List[Action]]]",
+    results: List[Optional[Exception]],
+    viewport,
+    device_scale_factor,
+    is_head: bool,
+    is_no_sandbox: Optional[bool],
+    extra_chromium_args: Optional[List[str]],
+    block_resources: Optional[Union[str, Iterable[str]]],
+) -> Optional[Exception]:
+    """
+    Run queued jobs until the queue is empty. Returns the launch error when this worker could not start a browser;
+    it then takes no job, so the jobs stay queued for the other workers.
+    """
+    import queue
+    from playwright.sync_api import sync_playwright
+    # The sync API can't be shared across threads, so every worker owns its playwright and browser.
+    with sync_playwright() as p:
+        try:
+            browser, engine_used = _launch_browser(p, is_head, is_no_sandbox, extra_chromium_args)
+        except Exception as exc:
+            print(f"[warn] batch worker could not launch a browser: {exc}")
+            return exc
+        try:
+            while True:
+                try:
+                    index, html_path, actions = jobs.get_nowait()
+                except queue.Empty:
+                    break
                 try:
-                    page.wait_for_function(
-                        f"() => document.fonts && document.fonts.check({font_check_value_json})",
-                        timeout=5000,
+                    _run_actions_in_browser(
+                        browser, engine_used, _to_url(html_path), actions, viewport, device_scale_factor,
+                        block_resources,
                     )
                 except Exception as exc:
-                    print(f"[warn] font readiness wait failed: {exc}")
+                    print(f"[warn] job {index} failed: {exc}")
+                    results[index] = exc
+        finally:
+            browser.close()
+    return None
+
+
+def run_actions_on_html_batch(
+    jobs: List[Tuple[Union[Path, str], Iterable[Union[Dict[str, Any], Action]]]],
+    concurrency: int=4,
+    viewport=(1080, 2400),
+    device_scale_factor=DEFAULT_DEVICE_SCALE_FACTOR,
+    is_head: bool=False,
+    is_no_sandbox: Optional[bool]=None,
+    extra_chromium_args: Optional[List[str]]=None,
+    block_resources: Optional[Union[str, Iterable[str]]]=None
+) -> List[Optional[Exception]]:
+    """
+    Run (html_path, actions) jobs on `concurrency` separate browsers in parallel.
+    Screenshots are serialized per browser, so each worker launches its own instead of sharing contexts.
+    Returns one entry per job: None on success, otherwise the raised exception.
+    Every job's actions are compiled first, so a malformed one raises before any browser is launched.
+    """
+    import queue
+    from concurrent.futures import ThreadPoolExecutor
+    jobs = [(html_path, compile_actions(actions)) for html_path, actions in jobs]
+    if not jobs:
+        return []
+    queued: "queue.Queue[Tuple[int, Union[Path, str], List[Action]]]" = queue.Queue()
+    for index, (html_path, actions) in enumerate(jobs):
+        queued.put((index, html_path, actions))
+    results: List[Optional[Exception]] = [None] * len(jobs)
+    n_workers = max(1, min(concurrency, len(jobs)))
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        futures = [
+            executor.submit(
+                _run_batch_worker, queued, results, viewport, device_scale_factor,
+                is_head, is_no_sandbox, extra_chromium_args, block_resources,
+            )
+            for _ in range(n_workers)
+        ]
+        launch_errors = [future.result() for future in futures]
+    # Only workers with a browser take jobs, so anything still queued had none to run it.
+    while True:
+        try:
+            index, _, _ = queued.get_nowait()
+        except queue.Empty:
+            break
+        results[index] = next(exc for exc in launch_errors if exc is not None)
+    return results
+
+
+def _run_daemon_request(request: Dict[str, Any], is_head: bool, is_no_sandbox: Optional[bool], extra_chromium_args) -> None:
+    run_actions_on_html(
+        request["html"],
+        request.get("actions", []),
+        viewport=tuple(request.get("viewport", (1080, 2400))),
+        device_scale_factor=request.get("device_scale_factor", DEFAULT_DEVICE_SCALE_FACTOR),
+        is_head=is_head,
+        is_no_sandbox=is_no_sandbox,
+        extra_chromium_args=extra_chromium_args,
+        block_resources=request.get("block"),
+    )
+
+
+def _remove_stale_socket(socket_path: Path) -> None:
+    """
+    Remove socket_path if it is a socket left behind by a daemon that is gone.
+    Raises FileExistsError when it is not a socket, or when a daemon is still listening on it.
+    """
+    import socket
+    import stat
+    try:
+        mode = socket_path.lstat().st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"{socket_path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except ConnectionRefusedError:
+            socket_path.unlink()
+            return
+    raise FileExistsError(f"a daemon is already serving on {socket_path}")
+
+
+def serve(
+    socket_path: Union[Path, str],
+    is_head: bool=False,
+    is_no_sandbox: Optional[bool]=None,
+    extra_chromium_args: Optional[List[str]]=None
+):
+    """
+    Serve run_actions_on_html on a unix socket so every request reuses the same launched browser.
+    Each connection sends one JSON line {"html", "actions", "viewport", "device_scale_factor", "block"} and receives one
+    JSON line {"ok", "log", "error"}. Requests are handled one at a time because the sync API is bound to this thread.
+    """
+    import contextlib
+    import io
+    import socketserver
+    socket_path = Path(socket_path)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            log = io.StringIO()
+            reply: Dict[str, Any] = {"ok": True, "error": None}
             try:
-                ok = page.evaluate(
-                    f"() => document.fonts ? document.fonts.check({font_check_value_json}) : false"
-                )
-                print(f"[info] font check '{FONT_FAMILY_NAME}': {ok}")
+                request = json.loads(self.rfile.readline())
+                with contextlib.redirect_stdout(log):
+                    _run_daemon_request(request, is_head, is_no_sandbox, extra_chromium_args)
             except Exception as exc:
-                print(f"[warn] font check evaluation failed: {exc}")
-
-        for i, action in enumerate(actions):
-            kind = action.get("action")
-            print(f"[{i}] do: {kind} -> {action}")
-            if kind == "click":
-                selector = action["selector"]
-                page.click(selector)
-            elif kind == "scroll":
-                target = action.get("target", "window")
-                x = action.get("x", 0)
-                y = action.get("y", 0)
-                delta = {"x": x, "y": y}
-                if target == "window":
-                    # ウィンドウ全体をスクロール
-                    page.evaluate("(offset) => window.scrollBy(offset.x, offset.y)", delta)
-                else:
-                    # 特定要素内をスクロール
-                    sel = target
-                    page.eval_on_selector(
-                        sel,
-                        "(el, offset) => { el.scrollBy(offset.x, offset.y); }",
-                        arg=delta,
-                    )
-            elif kind == "wait":
-                ms = action.get("ms", 500)
-                page.wait_for_timeout(ms)
-            elif kind == "type":
-                selector = action["selector"]
-                text = action["text"]
-                clear = action.get("clear", True)
-                if clear:
-                    page.fill(selector, "")
-                page.type(selector, text)
-            elif kind == "screenshot":
-                path = action.get("path", f"shot_{i:03}.png")
-                full_page = action.get("full_page", True)
-                page.screenshot(path=path, full_page=full_page)
-            else:
-                print(f"unknown action: {kind}")
-        context.close()
-        browser.close()
-
-def test_html():
-    return """
+                reply = {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+            reply["log"] = log.getvalue()
+            self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+
+    _remove_stale_socket(socket_path)
+    # Launch up-front so the first request doesn't pay for it.
+    _get_browser(is_head, is_no_sandbox, extra_chromium_args)
+    with socketserver.UnixStreamServer(str(socket_path), Handler) as server:
+        print(f"[info] serving on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            socket_path.unlink(missing_ok=True)
+
+
+def send_to_daemon(
+    socket_path: Union[Path, str],
+    html_path: Union[Path, str],
+    actions: List[Dict[str, Any]],
+    viewport=(1080, 2400),
+    device_scale_factor=DEFAULT_DEVICE_SCALE_FACTOR,
+    block_resources: Optional[Union[str, Iterable[str]]]=None
+) -> Dict[str, Any]:
+    """
+    Send one job to a running serve() and return its reply.
+    html_path and relative screenshot paths are resolved here, since the daemon may run in another directory.
+    """
+    import socket
+    compiled = compile_actions(actions)  # fail here rather than in the daemon
+    # The compiled path also covers the default shot_NNN name of a screenshot without "path".
+    actions = [
+        {**action, "path": str(Path(action_compiled.path).resolve())}
+        if isinstance(action_compiled, ScreenshotAction) else action
+        for action, action_compiled in zip(actions, compiled)
+    ]
+    request = {
+        "html": _to_url(html_path),
+        "actions": actions,
+        "viewport": list(viewport),
+        "device_scale_factor": device_scale_factor,
+        "block": block_resources,
+    }
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(socket_path))
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as reader:
+            return json.loads(reader.readline())
+
+
+_TEST_HTML = """
 <!DOCTYPE html>
 <html lang="ja">
 <head>
@@ -1127,23 +1936,38 @@ def test_html():
 </html>
 """.strip()
 
+def test_html():
+    return _TEST_HTML
+
 def html_string_to_data_uri(html: str) -> str:
-    quoted = urllib.parse.quote(html)
-    return f"data:text/html;charset=utf-8,{quoted}"
+    # base64 runs in C and is far shorter than percent-encoding for non-ASCII (e.g. Japanese) text.
+    b64 = base64.b64encode(html.encode("utf-8")).decode("ascii")
+    return f"data:text/html;charset=utf-8;base64,{b64}"
+
+@functools.cache
+def test_html_data_uri() -> str:
+    """Data URI of the built-in demo page, encoded once per process."""
+    return html_string_to_data_uri(_TEST_HTML)
 
 if __name__ == "__main__":
     import argparse
+    import textwrap
 
-    default_actions = [{"action": "wait", "ms": 10000}, ]
+    # --head keeps the window open for a while so it can be looked at; otherwise just wait until the page settles.
+    default_actions_head = [{"action": "wait", "ms": 10000}, ]
+    default_actions      = [{"action": "wait_ready", "timeout": 10000}, ]
 
     action_description = textwrap.dedent(
         """\
         Actions JSON の書き方（selector は .class でも #id でもOK）:
-          - wait: {"action":"wait","ms":500}
+          - wait_ready: {"action":"wait_ready","timeout":10000,"state":"networkidle"}  # 状態に達したら即次へ。timeout は上限（超えても続行）
+          - wait: {"action":"wait","ms":500}  # 固定時間スリープ（デバッグ用）
+          - wait_networkidle: {"action":"wait_networkidle","timeout":30000}  # 通信が 500ms 途切れるまで待つ
           - click: {"action":"click","selector":".btn"}
           - scroll: {"action":"scroll","target":"#main-content","x":0,"y":800}  # target はスクロールさせたい要素の CSS セレクタ。window 指定は不可
           - type: {"action":"type","selector":"input[name=q]","text":"hello","clear":true}
           - screenshot: {"action":"screenshot","path":"shot.png","full_page":false}
+            # path の拡張子 (.png/.jpg/.webp) か "format":"png|jpeg|webp"（jpg も可）で形式を指定。jpeg/webp は "quality":85 (既定) が使える
 
         例（組み込みデモ HTML 向け。セレクタは .class / #id のどちらでも指定可）:
           pyplaywright -a '[{"action":"wait","ms":1000},{"action":"screenshot","path":"01_initial.png","full_page":false}]'
@@ -1165,7 +1989,7 @@ if __name__ == "__main__":
     parser.add_argument(
         "-f",
         "--file",
-        help="入力 HTML ファイルへのパス（data URI も可）。未指定の場合は組み込みデモを使用。",
+        help="入力 HTML ファイルへのパス（data: / http(s): / file: の URL も可）。未指定の場合は組み込みデモを使用。",
     )
     parser.add_argument(
         "-v",
@@ -1176,12 +2000,22 @@ if __name__ == "__main__":
         default=(375, 667),
         help="モバイル表示用の viewport サイズ(px)。例: -v 375 667",
     )
+    parser.add_argument(
+        "-s",
+        "--scale",
+        type=float,
+        default=DEFAULT_DEVICE_SCALE_FACTOR,
+        help=f"device scale factor（デバイスピクセル比）。既定: {DEFAULT_DEVICE_SCALE_FACTOR}",
+    )
     parser.add_argument(
         "-a",
         "--actions",
         type=json.loads,
-        default=default_actions,
-        help="順番に実行するアクションの JSON 配列。詳細は下部の説明を参照。",
+        default=None,
+        help=(
+            "順番に実行するアクションの JSON 配列。詳細は下部の説明を参照。"
+            "未指定なら wait_ready（--head 時は 10 秒の wait）。"
+        ),
     )
     parser.add_argument(
         "--test",
@@ -1196,14 +2030,76 @@ if __name__ == "__main__":
     parser.add_argument(
         "--no-sandbox",
         action="store_true",
-        help="sandbox を無効にする。",
+        default=None,
+        help="sandbox を無効にする（既定）。",
+    )
+    parser.add_argument(
+        "--sandbox",
+        dest="no_sandbox",
+        action="store_false",
+        default=None,
+        help="chromium の sandbox を有効にする。起動できない環境では sandbox なしで再起動する。",
+    )
+    parser.add_argument(
+        "--chromium-arg",
+        action="append",
+        default=[],
+        metavar="ARG",
+        help="chromium の起動引数を追加する（複数回指定可）。例: --chromium-arg=--single-process",
+    )
+    parser.add_argument(
+        "--block",
+        type=parse_block_resources,
+        default=None,
+        metavar="TYPES",
+        help=(
+            "読み込みをブロックするリソース種別（images,fonts,stylesheets,media のカンマ区切り）。"
+            "未指定なら screenshot が無いときだけ images,fonts,media をブロック。"
+        ),
+    )
+    parser.add_argument(
+        "--daemon",
+        metavar="SOCKET",
+        help="ブラウザを起動したまま unix socket で待ち受ける常駐モード。--send からのジョブを順に処理する。",
+    )
+    parser.add_argument(
+        "--send",
+        metavar="SOCKET",
+        help="起動せずに --daemon で常駐しているプロセスへジョブを送る。",
     )
     args = parser.parse_args()
+    if args.daemon:
+        try:
+            serve(args.daemon, is_head=args.head, is_no_sandbox=args.no_sandbox, extra_chromium_args=args.chromium_arg)
+        except FileExistsError as exc:
+            raise SystemExit(f"[error] {exc}")
+        raise SystemExit(0)
     if args.test or not args.file:
         if not args.file and not args.test:
             print("[info] --file が指定されていないため組み込みデモ HTML を使用します。")
-        html_path = html_string_to_data_uri(test_html())
+        html_path = test_html_data_uri()
     else:
-        html_path = Path(args.file)
+        html_path = args.file if args.file.startswith(URL_PREFIXES) else Path(args.file)
+    if args.actions is None:
+        args.actions = default_actions_head if args.head else default_actions
     actions = args.actions if args.actions else []
-    run_actions_on_html(html_path, actions, viewport=args.viewport, is_head=args.head, is_no_sandbox=args.no_sandbox)
+    if not isinstance(actions, list):
+        parser.error("-a/--actions はアクションの JSON 配列で指定してください。")
+    try:
+        compiled_actions = compile_actions(actions)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.send:
+        reply = send_to_daemon(
+            args.send, html_path, actions, viewport=args.viewport, device_scale_factor=args.scale,
+            block_resources=sorted(args.block) if args.block is not None else None, # JSON has no sets
+        )
+        print(reply["log"], end="")
+        if not reply["ok"]:
+            raise SystemExit(f"[error] {reply['error']}")
+        raise SystemExit(0)
+    run_actions_on_html(
+        html_path, compiled_actions, viewport=args.viewport, device_scale_factor=args.scale,
+        is_head=args.head, is_no_sandbox=args.no_sandbox, extra_chromium_args=args.chromium_arg,
+        block_resources=args.block,
+    )